@@ -13,11 +13,14 @@ Behavior:
 """
 
 import argparse
+import atexit
 import logging
 import os
+import signal
 import subprocess
 import sys
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 from dotenv import load_dotenv
@@ -29,20 +32,25 @@ from core import (
     run_command,
     run_command_no_raise,
     resolve_chromium_src,
-    read_file_paths_raw,
-    remove_processed_path,
+    QueueState,
     ensure_clean_workspace,
     current_branch,
     head_sha,
     create_temporary_branch,
     checkout_branch,
-    process_file_with_abs_path,
+    process_files_batch,
+    write_converted_file,
+    invalidate_cached_conversion,
     run_single_web_test,
-    file_has_changes,
-    commit_and_upload,
+    dirty_paths,
+    restore_file,
+    flush_batch,
+    GitDaemon,
 )
 
-from gemini import initialize_gemini_client
+from gemini import initialize_gemini_client, refresh_instruction_cache, BATCH_SIZE
+
+SCRIPT_DIR = Path(__file__).resolve().parent
 
 # --- Main ---
 def main():
@@ -52,9 +60,8 @@ def main():
     args = parser.parse_args()
 
     # Load .env from script dir
-    script_dir = Path(__file__).resolve().parent
-    load_dotenv(dotenv_path=script_dir / '.env')
-    logging.info("Loaded .env from %s", script_dir)
+    load_dotenv(dotenv_path=SCRIPT_DIR / '.env')
+    logging.info("Loaded .env from %s", SCRIPT_DIR)
 
     # Resolve chromium/src
     try:
@@ -71,96 +78,228 @@ def main():
         logging.critical("Gemini init failed: %s", e)
         sys.exit(1)
 
-    # Read raw paths from queue file (next to script)
-    queue_file = script_dir / config.INPUT_FILE_PATH
-    raw_paths = read_file_paths_raw(queue_file)
-    if not raw_paths:
+    # Load the queue file (next to script) once into an in-memory model
+    queue_file = SCRIPT_DIR / config.INPUT_FILE_PATH
+    queue_state = QueueState(queue_file)
+    if not len(queue_state):
         logging.info("No paths in queue.")
         return
+    raw_paths = list(queue_state.entries)
 
-    # Translate raw paths -> absolute paths on disk (relative to chromium/src)
+    # Translate raw paths -> (raw, absolute, src-relative) tuples up front so
+    # the hot loop never re-parses or re-relativizes paths.
+    src_root = Path(chromium_src)
     abs_path_map = []
     for raw in raw_paths[:args.n]:
         raw_stripped = raw.strip()
         if os.path.isabs(raw_stripped):
-            abs_path = raw_stripped
+            abs_p = Path(raw_stripped)
         else:
-            abs_path = str(Path(chromium_src) / raw_stripped)
-        abs_path_map.append((raw_stripped, abs_path))
+            abs_p = src_root / raw_stripped
+        abs_path_map.append((raw_stripped, str(abs_p), os.path.relpath(str(abs_p), start=chromium_src)))
+
+    if not abs_path_map:
+        logging.info("Nothing to process (n=%d).", args.n)
+        return
+
+    # Queue persistence is lazy (every few completions + at exit, including
+    # SIGINT/SIGTERM) — not a rewrite after every single entry.
+    atexit.register(queue_state.persist)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(1))
 
     original_branch = current_branch(cwd=chromium_src)
     original_head = head_sha(cwd=chromium_src)
     logging.info("Repo original branch=%s head=%s", original_branch, original_head)
 
-    for raw_rel, abs_path in abs_path_map:
-        tmp_branch = None
-        try:
-            logging.info("=== START %s (absolute: %s) ===", raw_rel, abs_path)
-
-            # ensure clean workspace inside chromium/src
-            ensure_clean_workspace(cwd=chromium_src)
-
-            # create temp branch inside chromium/src with name automateN (never delete)
-            tmp_branch = create_temporary_branch(cwd=chromium_src)
-            logging.info("Created branch: %s", tmp_branch)
-
-            # Convert the file (abs_path is used to read/write the file on disk)
-            result = process_file_with_abs_path(model, abs_path)
-
-            if result == "no-change":
-                # nothing to commit; switch back and leave branch as-is; remove from queue
-                checkout_branch(original_branch, cwd=chromium_src)
-                logging.info("No changes for %s. Removed from queue.", raw_rel)
-                remove_processed_path(queue_file, raw_rel)
-                continue
-
-            # run the web test on the converted file (relative path)
-            relpath_for_git = os.path.relpath(abs_path, start=chromium_src)
-            test_ok = run_single_web_test(chromium_src, relpath_for_git)
-            if not test_ok:
-                logging.warning("Test failed for %s; aborting commit and leaving file in queue.", relpath_for_git)
-                # rollback repo to original HEAD (but keep branch)
+    # Staged-upload state: successful conversions accumulate on one automateN
+    # branch and go out as a single CL every UPLOAD_BATCH_SIZE files, so the
+    # dominant git cl upload round-trip is paid once per batch, not per file.
+    upload_batch_size = getattr(config, 'UPLOAD_BATCH_SIZE', 8)
+    staged_files = []   # src-relative paths staged on the current upload branch
+    staged_raw = []     # their queue entries (marked processed after upload)
+    upload_state = {'branch': None}
+
+    # batched staging: paths queue in memory and one update-index run per
+    # upload flush stages them, instead of one git add fork per file
+    git_daemon = GitDaemon(chromium_src)
+    atexit.register(git_daemon.close)
+
+    def rollback_hard():
+        git_daemon.discard_staging()
+        checkout_branch(original_branch, cwd=chromium_src)
+        run_command(['git', 'reset', '--hard', original_head], cwd=chromium_src)
+        staged_files.clear()
+        staged_raw.clear()
+        upload_state['branch'] = None
+
+    def flush_uploads():
+        # stage the queued paths first so the commit below picks them up;
+        # anything that failed to stage is not part of this upload and must
+        # keep its queue entry
+        failed = set(git_daemon.flush_staging())
+        if failed:
+            logging.warning("%d file(s) failed to stage; leaving them in the queue.", len(failed))
+            kept = [(f, r) for f, r in zip(staged_files, staged_raw) if f not in failed]
+            staged_files[:] = [f for f, _ in kept]
+            staged_raw[:] = [r for _, r in kept]
+        if staged_files:
+            flush_batch(chromium_src, staged_files)
+            for done in staged_raw:
+                queue_state.mark_done(done)
+            logging.info("Uploaded %d file(s) as one CL on branch %s.",
+                         len(staged_files), upload_state['branch'])
+            staged_files.clear()
+            staged_raw.clear()
+        if upload_state['branch'] is not None:
+            checkout_branch(original_branch, cwd=chromium_src)
+            upload_state['branch'] = None
+
+    # Pipeline: a single worker thread converts batch i+1 (network-bound Gemini
+    # calls) while the main thread runs web tests and git operations for batch i
+    # (compute-bound). Git operations stay serialized on the main thread because
+    # they share one working tree.
+    batches = [abs_path_map[i:i + BATCH_SIZE] for i in range(0, len(abs_path_map), BATCH_SIZE)]
+    interrupted = False
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        pending = executor.submit(process_files_batch, model, [p for _, p, _ in batches[0]])
+        for batch_idx, batch in enumerate(batches):
+            # the wait for the next conversion batch can be long; keep it
+            # inside the interrupt envelope so Ctrl-C here still rolls back
+            try:
+                converted_map = pending.result()
+            except KeyboardInterrupt:
+                logging.warning("Interrupted while waiting for conversions. Attempting rollback.")
                 try:
-                    checkout_branch(original_branch, cwd=chromium_src)
-                    run_command(['git', 'reset', '--hard', original_head], cwd=chromium_src)
+                    rollback_hard()
                 except Exception as e:
-                    logging.error("Rollback after test failure encountered an error: %s", e)
-                # DO NOT remove from queue; DO NOT delete branch
-                continue
+                    logging.error("Rollback failed: %s", e)
+                interrupted = True
+                pending.cancel()
+                break
+            except Exception as e:
+                # a worker failure must not abort the run mid-branch; roll
+                # back and let this batch's entries stay queued for retry
+                logging.error("Conversion batch failed: %s", e)
+                try:
+                    rollback_hard()
+                except Exception as re:
+                    logging.warning("Partial rollback failure: %s", re)
+                logging.warning("Left %d file(s) in queue for retry.", len(batch))
+                converted_map = {}
+            if batch_idx + 1 < len(batches):
+                # web tests take minutes per file, so long queues outlive the
+                # 1h CachedContent TTL; extend it before each prefetch
+                refresh_instruction_cache()
+                pending = executor.submit(process_files_batch, model, [p for _, p, _ in batches[batch_idx + 1]])
+
+            # files that were written and passed their web test; change-checked
+            # and staged together after the loop
+            survivors = []
+            for raw_rel, abs_path, relpath_for_git in batch:
+                try:
+                    logging.info("=== START %s (absolute: %s) ===", raw_rel, abs_path)
 
-            # Only commit/upload if git sees changes relative to HEAD
-            if not file_has_changes(relpath_for_git, cwd=chromium_src):
-                logging.info("Git sees no changes for %s after conversion; skipping commit and removing from queue.", raw_rel)
-                checkout_branch(original_branch, cwd=chromium_src)
-                remove_processed_path(queue_file, raw_rel)
-                continue
+                    new_content = converted_map.get(abs_path)
+                    if new_content is None:
+                        logging.warning("No conversion result for %s; leaving in queue.", raw_rel)
+                        continue
 
-            # commit & upload
-            commit_and_upload(relpath_for_git, cwd=chromium_src)
+                    # first file of an upload batch: clean workspace, new branch
+                    if upload_state['branch'] is None:
+                        ensure_clean_workspace(cwd=chromium_src)
+                        upload_state['branch'] = create_temporary_branch(cwd=chromium_src)
+                        logging.info("Created branch: %s", upload_state['branch'])
 
-            # success -> switch back, keep branch (do not delete), remove from queue
-            checkout_branch(original_branch, cwd=chromium_src)
-            remove_processed_path(queue_file, raw_rel)
-            logging.info("Uploaded and removed %s from queue. Note: branch %s retained.", raw_rel, tmp_branch)
+                    # Write the converted content to disk (abs_path, now on the upload branch)
+                    result = write_converted_file(abs_path, new_content)
+
+                    if result == "no-change":
+                        logging.info("No changes for %s. Removed from queue.", raw_rel)
+                        queue_state.mark_done(raw_rel)
+                        continue
+
+                    # run the web test on the converted file (relative path)
+                    test_ok = run_single_web_test(chromium_src, relpath_for_git)
+                    if not test_ok:
+                        logging.warning("Test failed for %s; restoring file and leaving it in queue.", relpath_for_git)
+                        # throw away only this file; staged batch-mates survive
+                        try:
+                            restore_file(relpath_for_git, cwd=chromium_src)
+                        except Exception as e:
+                            logging.error("Restore after test failure encountered an error: %s", e)
+                            rollback_hard()
+                            continue
+                        # the cached conversion just failed validation; drop it
+                        # so the retry re-queries Gemini instead of replaying it
+                        invalidate_cached_conversion(abs_path)
+                        continue
+
+                    survivors.append((raw_rel, relpath_for_git))
+
+                except KeyboardInterrupt:
+                    logging.warning("Interrupted by user. Attempting rollback.")
+                    try:
+                        rollback_hard()
+                    except Exception as e:
+                        logging.error("Rollback failed: %s", e)
+                    interrupted = True
+                    break
+                except Exception as e:
+                    logging.error("Error processing %s: %s", raw_rel, e)
+                    logging.info("Rolling back to original branch & head.")
+                    failed_branch = upload_state['branch']
+                    try:
+                        rollback_hard()
+                    except Exception as re:
+                        logging.warning("Partial rollback failure: %s", re)
+                    logging.warning("Left %s in queue for retry. Branch %s (if created) is retained.",
+                                    raw_rel, failed_branch)
+                    continue
 
-        except KeyboardInterrupt:
-            logging.warning("Interrupted by user. Attempting rollback.")
+            if interrupted:
+                pending.cancel()
+                break
+
+            # Only stage files git sees as changed relative to HEAD; one
+            # status call covers the whole batch instead of one per file.
             try:
-                checkout_branch(original_branch, cwd=chromium_src)
-                run_command(['git', 'reset', '--hard', original_head], cwd=chromium_src)
+                changed = dirty_paths([rp for _, rp in survivors], cwd=chromium_src)
+                for raw_rel, relpath_for_git in survivors:
+                    if relpath_for_git not in changed:
+                        logging.info("Git sees no changes for %s after conversion; skipping commit and removing from queue.", raw_rel)
+                        queue_state.mark_done(raw_rel)
+                        continue
+                    git_daemon.stage(relpath_for_git)
+                    staged_files.append(relpath_for_git)
+                    staged_raw.append(raw_rel)
+                    logging.info("Staged %s (%d/%d in upload batch).",
+                                 raw_rel, len(staged_files), upload_batch_size)
+                if len(staged_files) >= upload_batch_size:
+                    flush_uploads()
+            except KeyboardInterrupt:
+                logging.warning("Interrupted by user. Attempting rollback.")
+                try:
+                    rollback_hard()
+                except Exception as e:
+                    logging.error("Rollback failed: %s", e)
+                interrupted = True
+                pending.cancel()
+                break
             except Exception as e:
-                logging.error("Rollback failed: %s", e)
-            break
+                logging.error("Error staging/uploading batch: %s", e)
+                failed_branch = upload_state['branch']
+                try:
+                    rollback_hard()
+                except Exception as re:
+                    logging.warning("Partial rollback failure: %s", re)
+                logging.warning("Left %d file(s) in queue for retry. Branch %s (if created) is retained.",
+                                len(survivors), failed_branch)
+
+    if not interrupted:
+        try:
+            flush_uploads()
         except Exception as e:
-            logging.error("Error processing %s: %s", raw_rel, e)
-            logging.info("Rolling back to original branch & head.")
-            try:
-                checkout_branch(original_branch, cwd=chromium_src)
-                run_command(['git', 'reset', '--hard', original_head], cwd=chromium_src)
-            except Exception as re:
-                logging.warning("Partial rollback failure: %s", re)
-            logging.warning("Left %s in queue for retry. Branch %s (if created) is retained.", raw_rel, tmp_branch)
-            continue
+            logging.error("Final upload flush failed: %s", e)
 
     logging.info("All done.")
 
@@ -1,7 +1,9 @@
 # config.py
 INPUT_FILE_PATH = 'file_paths.txt'
 GEMINI_MODEL_NAME = 'gemini-2.5-flash'
+GEMINI_CONCURRENCY = 4  # concurrent Gemini requests; keep within the account's RPM limit
 GERRIT_REVIEWERS = ['hongchan@chromium.org', 'mjwilson@chromium.org']
+UPLOAD_BATCH_SIZE = 8  # converted files per CL; one git cl upload per batch
 BUG_ID = '396477778'
 CHROMIUM_SRC_PATH = '/home/g2mesaqlain/chromium/src'
 
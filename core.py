@@ -1,19 +1,45 @@
 #!/usr/bin/env python3
 import argparse
+import functools
 import logging
 import os
+import re
+import stat
 import subprocess
 import sys
+import tempfile
 import time
+from collections import deque
 from datetime import datetime
 from pathlib import Path
 from dotenv import load_dotenv
 import config
+# gemini.py does not import core, so this is safe at module level; the
+# wrappers below delegate to it without a sys.modules lookup per call.
+import gemini
+
+# libgit2 bindings: read-only git queries without a fork+exec per call.
+# Optional — every caller falls back to subprocess git when unavailable.
+try:
+    import pygit2
+except ImportError:
+    pygit2 = None
 
 # Constants
+SCRIPT_DIR = Path(__file__).resolve().parent
+# config values used in the per-file hot path, bound once at import
+_CHROMIUM_SRC_PATH = getattr(config, 'CHROMIUM_SRC_PATH', None)
+_GERRIT_REVIEWERS = getattr(config, 'GERRIT_REVIEWERS', None)
+_BUG_ID = str(getattr(config, 'BUG_ID', ''))
 GIT_CLEAN_CMD = ['git', 'clean', '-fd']
 GIT_RESET_HARD_CMD = ['git', 'reset', '--hard']
 GIT_CL_UPLOAD_BASE_CMD = ['git', 'cl', 'upload', '--send-mail', '--force']
+# Reviewers never change within a run; resolve them into the final upload
+# argv once at import instead of rebuilding it per CL.
+_UPLOAD_CMD = tuple(
+    GIT_CL_UPLOAD_BASE_CMD
+    + (['-r', ','.join(_GERRIT_REVIEWERS)] if _GERRIT_REVIEWERS else [])
+)
 MAX_API_RETRIES = 4
 API_BACKOFF_BASE = 1.5
 
@@ -22,10 +48,27 @@ def setup_logging():
     logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 # --- Subprocess helpers (cwd optional) ---
+# Trusted internal tool: no fds need hiding from children, so skip the
+# close_fds sweep of the fd table that subprocess performs on every spawn.
+_SPAWN_KWARGS = {'close_fds': False}
+
 def run_command(cmd, check=True, capture_output=True, text=True, cwd=None):
+    """
+    capture_output selects how much child output is piped through Python:
+    True buffers both streams (callers that read stdout), 'error-only'
+    discards stdout but keeps stderr for the failure message, and False sends
+    both to DEVNULL — no pipes, no buffering, no decode.
+    """
     logging.debug("Running: %s (cwd=%s)", " ".join(cmd), cwd)
+    if capture_output is True:
+        stream_kwargs = {'capture_output': True}
+    elif capture_output == 'error-only':
+        stream_kwargs = {'stdout': subprocess.DEVNULL, 'stderr': subprocess.PIPE}
+    else:
+        stream_kwargs = {'stdout': subprocess.DEVNULL, 'stderr': subprocess.DEVNULL}
     try:
-        proc = subprocess.run(cmd, check=check, capture_output=capture_output, text=text, cwd=cwd)
+        proc = subprocess.run(cmd, check=check, text=text, cwd=cwd,
+                              **stream_kwargs, **_SPAWN_KWARGS)
         return (proc.stdout or "").strip()
     except subprocess.CalledProcessError as e:
         stderr = (e.stderr or "").strip()
@@ -33,128 +76,458 @@ def run_command(cmd, check=True, capture_output=True, text=True, cwd=None):
 
 def run_command_no_raise(cmd, cwd=None):
     logging.debug("Running (no-raise): %s (cwd=%s)", " ".join(cmd), cwd)
-    return subprocess.run(cmd, check=False, capture_output=True, text=True, cwd=cwd)
+    return subprocess.run(cmd, check=False, capture_output=True, text=True, cwd=cwd,
+                          **_SPAWN_KWARGS)
+
+def run_status_only(cmd, cwd=None):
+    """
+    Run a command where only the exit status matters: no pipes to create, no
+    output to read or decode. Returns the returncode.
+    """
+    logging.debug("Running (status-only): %s (cwd=%s)", " ".join(cmd), cwd)
+    return subprocess.run(cmd, check=False, stdout=subprocess.DEVNULL,
+                          stderr=subprocess.DEVNULL, cwd=cwd, **_SPAWN_KWARGS).returncode
 
 # --- Resolve chromium/src ---
+def _dir_or_none(path):
+    # one stat of the final inode instead of Path.resolve() stat'ing every
+    # component; realpath only runs for the candidate that matched
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return os.path.realpath(path) if stat.S_ISDIR(st.st_mode) else None
+
+@functools.lru_cache(maxsize=1)
 def resolve_chromium_src():
-    cfg = getattr(config, 'CHROMIUM_SRC_PATH', None)
+    cfg = _CHROMIUM_SRC_PATH
     if cfg:
-        p = Path(cfg).expanduser().resolve()
-        if p.is_dir():
-            return str(p)
-        logging.warning("Configured CHROMIUM_SRC_PATH not found: %s", p)
+        found = _dir_or_none(os.path.expanduser(cfg))
+        if found:
+            return found
+        logging.warning("Configured CHROMIUM_SRC_PATH not found: %s", cfg)
 
-    script_dir = Path(__file__).resolve().parent
-    candidate = script_dir.parent / 'src'
-    if candidate.is_dir():
-        return str(candidate.resolve())
-
-    candidate2 = script_dir.parent.parent / 'src'
-    if candidate2.is_dir():
-        return str(candidate2.resolve())
+    for candidate in (SCRIPT_DIR.parent / 'src', SCRIPT_DIR.parent.parent / 'src'):
+        found = _dir_or_none(candidate)
+        if found:
+            return found
 
     raise RuntimeError("Could not resolve chromium/src path. Set CHROMIUM_SRC_PATH in config.py.")
 
 # --- Queue helpers ---
-def read_file_paths_raw(queue_file_path):
+def iter_file_paths_raw(queue_file_path):
+    """Yield stripped, non-empty queue lines without loading the file whole."""
     try:
         with open(queue_file_path, 'r', encoding='utf-8') as fh:
-            return [line.rstrip('\n') for line in fh.readlines() if line.strip()]
+            for line in fh:
+                stripped = line.strip()
+                if stripped:
+                    yield stripped
     except FileNotFoundError:
         logging.error("Queue file not found: %s", queue_file_path)
-        return []
+
+def read_file_paths_raw(queue_file_path):
+    # single pass, one strip per line; entries come back already stripped
+    return list(iter_file_paths_raw(queue_file_path))
+
+def _rewrite_queue_atomic(queue_file_path, lines):
+    """Write lines to a sibling tempfile and os.replace it over the queue file,
+    so a crash mid-write can never leave a truncated queue behind."""
+    queue_dir = os.path.dirname(os.fspath(queue_file_path)) or '.'
+    with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=queue_dir,
+                                     delete=False) as fh:
+        tmp_name = fh.name
+        for line in lines:
+            fh.write(line)
+    os.replace(tmp_name, queue_file_path)
+
+def persist_queue(queue_file_path, raw_paths, processed):
+    """Rewrite the queue file once, dropping every processed entry."""
+    try:
+        _rewrite_queue_atomic(queue_file_path,
+                              (line + '\n' for line in raw_paths if line.strip() not in processed))
+    except IOError as e:
+        logging.error("Failed to persist queue file %s: %s", queue_file_path, e)
+
+class QueueState:
+    """
+    In-memory model of the queue file: loaded once, entries marked done in
+    O(1), and the file itself rewritten (atomically) only every persist_every
+    completions plus once at shutdown — instead of a full read+rewrite per
+    processed entry.
+    """
+
+    def __init__(self, queue_file_path, persist_every=8):
+        self.queue_file_path = queue_file_path
+        self.persist_every = persist_every
+        self.entries = deque(read_file_paths_raw(queue_file_path))
+        self.processed = set()
+        self._unpersisted = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def mark_done(self, path):
+        self.processed.add(path.strip())
+        self._unpersisted += 1
+        if self._unpersisted >= self.persist_every:
+            self.persist()
+
+    def persist(self):
+        if self._unpersisted == 0:
+            return
+        persist_queue(self.queue_file_path, list(self.entries), self.processed)
+        self._unpersisted = 0
 
 def remove_processed_path(queue_file_path, processed_path):
     processed = processed_path.strip()
     try:
-        with open(queue_file_path, 'r', encoding='utf-8') as fh:
-            lines = fh.readlines()
-        with open(queue_file_path, 'w', encoding='utf-8') as fh:
-            for line in lines:
-                if line.strip() != processed:
-                    fh.write(line)
+        # stream line-by-line: no whole-file list in memory
+        with open(queue_file_path, 'r', encoding='utf-8') as fh_in:
+            _rewrite_queue_atomic(queue_file_path,
+                                  (line for line in fh_in if line.strip() != processed))
     except IOError as e:
         logging.error("Failed to update queue file %s: %s", queue_file_path, e)
 
 # --- Gemini integration (delegated to gemini.py) ---
 def initialize_gemini_client():
-    # delegate to gemini module to keep exact behavior; import local to avoid circular import
-    from gemini import initialize_gemini_client as _init
-    return _init()
+    return gemini.initialize_gemini_client()
 
 def call_gemini_with_retries(model, prompt):
-    from gemini import call_gemini_with_retries as _call
-    return _call(model, prompt)
+    return gemini.call_gemini_with_retries(model, prompt)
 
 # --- Prompt builder (delegated to gemini.py) ---
 def build_prompt(file_path, original_content):
-    from gemini import build_prompt as _build
-    return _build(file_path, original_content)
+    return gemini.build_prompt(file_path, original_content)
 
 # --- File processing ---
 def process_file_with_abs_path(model, abs_path):
     logging.info("Processing file on disk: %s", abs_path)
-    # delegate full conversion to gemini.convert_file_with_gemini to preserve original code exactly
-    from gemini import convert_file_with_gemini
-    return convert_file_with_gemini(model, abs_path)
+    return gemini.convert_file_with_gemini(model, abs_path)
+
+def process_files_batch(model, abs_paths, batch_size=None):
+    return gemini.convert_files_batch(model, abs_paths, batch_size=batch_size or gemini.BATCH_SIZE)
+
+def convert_files_parallel(model, abs_paths):
+    """
+    Convert files with one Gemini request per file, all in flight concurrently
+    (bounded by config.GEMINI_CONCURRENCY). Same concurrency machinery as the
+    batched path, just without prompt packing — useful when a single oversized
+    batch prompt would degrade output quality. Returns {abs_path: text}.
+    """
+    return gemini.convert_files_batch(model, abs_paths, batch_size=1)
+
+def write_converted_file(abs_path, new_content):
+    return gemini.write_converted(abs_path, new_content)
+
+def invalidate_cached_conversion(abs_path):
+    """Forget the cached conversion for this file so a retry re-queries Gemini
+    (call after restoring the original content)."""
+    try:
+        gemini.conv_cache_invalidate(Path(abs_path).read_bytes())
+    except OSError as e:
+        logging.warning("Could not invalidate cached conversion for %s: %s", abs_path, e)
 
 # --- Git helpers (cwd = chromium/src) ---
+_pygit2_repos = {}
+
+def _pygit2_repo(cwd):
+    """Open (and cache) a pygit2 repository for cwd; None when unavailable."""
+    if pygit2 is None:
+        return None
+    repo = _pygit2_repos.get(cwd)
+    if repo is None:
+        try:
+            repo = pygit2.Repository(cwd)
+        except Exception as e:
+            logging.debug("pygit2 could not open %s: %s", cwd, e)
+            return None
+        _pygit2_repos[cwd] = repo
+    return repo
+
 def ensure_clean_workspace(cwd):
-    run_command(GIT_RESET_HARD_CMD, cwd=cwd)
-    run_command(GIT_CLEAN_CMD, cwd=cwd)
+    # output ("HEAD is now at ...", the list of removed files) is discarded
+    # anyway, so skip the pipes entirely
+    for cmd in (GIT_RESET_HARD_CMD, GIT_CLEAN_CMD):
+        rc = run_status_only(cmd, cwd=cwd)
+        if rc != 0:
+            raise RuntimeError(f"Command failed: {' '.join(cmd)} (exit {rc})")
+
+_HEAD_REF_RE = re.compile(r'^ref:\s*(refs/heads/(.+))$')
+_SHA_RE = re.compile(r'^[0-9a-f]{40}$')
+
+def _read_head(cwd):
+    """
+    Read .git/HEAD (and the referenced loose ref) directly, avoiding a git
+    process. Returns (branch, sha); either may be None when it cannot be
+    determined that way (detached HEAD, packed refs, worktree gitdir file).
+    """
+    git_dir = Path(cwd) / '.git'
+    try:
+        head = (git_dir / 'HEAD').read_text(encoding='utf-8').strip()
+    except OSError:
+        return None, None
+    m = _HEAD_REF_RE.match(head)
+    if m is None:
+        # detached HEAD: the file holds the sha itself
+        return (None, head) if _SHA_RE.match(head) else (None, None)
+    branch = m.group(2)
+    try:
+        sha = (git_dir / m.group(1)).read_text(encoding='utf-8').strip()
+    except OSError:
+        # loose ref missing: the ref lives in packed-refs
+        return branch, None
+    return branch, (sha if _SHA_RE.match(sha) else None)
 
 def current_branch(cwd):
+    repo = _pygit2_repo(cwd)
+    if repo is not None:
+        try:
+            return repo.head.shorthand
+        except Exception:
+            pass
+    branch, _ = _read_head(cwd)
+    if branch is not None:
+        return branch
     return run_command(['git', 'rev-parse', '--abbrev-ref', 'HEAD'], cwd=cwd)
 
 def head_sha(cwd):
+    repo = _pygit2_repo(cwd)
+    if repo is not None:
+        try:
+            return str(repo.head.target)
+        except Exception:
+            pass
+    _, sha = _read_head(cwd)
+    if sha is not None:
+        return sha
     return run_command(['git', 'rev-parse', 'HEAD'], cwd=cwd)
 
+def _max_automate_n(branch_names):
+    max_n = 0
+    for name in branch_names:
+        if name.startswith('automate'):
+            suffix = name[len('automate'):]
+            if suffix.isdigit():
+                n = int(suffix)
+                if n > max_n:
+                    max_n = n
+    return max_n
+
+# In-memory automate-branch counter, seeded once per cwd (branches are never
+# deleted, so scanning the ever-growing branch list per file is pure waste).
+# Persisted to .git/automate_next inside the checkout, so the counter follows
+# the repo it counts branches in and survives crashes.
+_automate_counters = {}
+
+def _automate_counter_file(cwd):
+    return Path(cwd) / '.git' / 'automate_next'
+
+def _seed_automate_counter(cwd):
+    # a valid counter file means a previous run already scanned; trust it and
+    # skip the branch enumeration entirely
+    try:
+        return int(_automate_counter_file(cwd).read_text().strip())
+    except (FileNotFoundError, ValueError, OSError):
+        pass
+    max_n = 0
+    repo = _pygit2_repo(cwd)
+    if repo is not None:
+        try:
+            max_n = _max_automate_n(repo.branches.local)
+        except Exception:
+            repo = None
+    if repo is None:
+        proc = run_command_no_raise(['git', 'branch', '--list', 'automate*'], cwd=cwd)
+        out = (proc.stdout or "").strip()
+        names = [line.strip().lstrip('*').strip() for line in out.splitlines()] if out else []
+        max_n = _max_automate_n(names)
+    return max_n
+
 def get_next_automate_branch(cwd):
     """
-    Find existing local branches named automateN and pick next N.
-    If none exist, return 'automate1'.
+    Pick the next automateN branch name. Scans existing branches only once per
+    run; afterwards the counter lives in memory (bumped by
+    create_temporary_branch after a successful checkout).
     """
-    proc = run_command_no_raise(['git', 'branch', '--list', 'automate*'], cwd=cwd)
-    out = (proc.stdout or "").strip()
-    max_n = 0
-    if out:
-        for line in out.splitlines():
-            name = line.strip().lstrip('*').strip()
-            if name.startswith('automate'):
-                suffix = name[len('automate'):]
-                if suffix.isdigit():
-                    n = int(suffix)
-                    if n > max_n:
-                        max_n = n
-    return f"automate{max_n + 1}"
+    n = _automate_counters.get(cwd)
+    if n is None:
+        n = _seed_automate_counter(cwd)
+        _automate_counters[cwd] = n
+    return f"automate{n + 1}"
 
 def create_temporary_branch(cwd):
     branch = get_next_automate_branch(cwd)
-    run_command(['git', 'checkout', '-b', branch], cwd=cwd)
+    run_command(['git', 'checkout', '-b', branch], cwd=cwd, capture_output='error-only')
+    # bump + persist only after the checkout actually succeeded
+    _automate_counters[cwd] = int(branch[len('automate'):])
+    try:
+        _automate_counter_file(cwd).write_text(str(_automate_counters[cwd]))
+    except OSError as e:
+        logging.warning("Could not persist automate branch counter: %s", e)
     return branch
 
 def checkout_branch(branch, cwd):
-    run_command(['git', 'checkout', branch], cwd=cwd)
+    run_command(['git', 'checkout', branch], cwd=cwd, capture_output='error-only')
+
+def workspace_state(filepath, cwd):
+    """
+    Return (dirty_worktree, dirty_index) for filepath from a single
+    `git status --porcelain=v2 -z` invocation.
+    """
+    proc = run_command_no_raise(['git', 'status', '--porcelain=v2', '-z', '--', filepath], cwd=cwd)
+    dirty_worktree = dirty_index = False
+    for record in (proc.stdout or '').split('\0'):
+        if not record:
+            continue
+        fields = record.split(' ')
+        if fields[0] in ('1', '2') and len(fields) > 1:
+            xy = fields[1]
+            dirty_index = dirty_index or xy[0] != '.'
+            dirty_worktree = dirty_worktree or xy[1] != '.'
+        elif fields[0] == '?':
+            dirty_worktree = True
+    return dirty_worktree, dirty_index
+
+def dirty_paths(filepaths, cwd):
+    """
+    Batched change check: one `git status --porcelain -z` call covering all
+    filepaths; returns the set of paths dirty in the worktree or index.
+    """
+    if not filepaths:
+        return set()
+    proc = run_command_no_raise(['git', 'status', '--porcelain', '-z', '--'] + list(filepaths), cwd=cwd)
+    dirty = set()
+    for record in (proc.stdout or '').split('\0'):
+        # record is "XY <path>"; rename origin paths come as bare follow-up
+        # records, which simply never match a queried path
+        if len(record) > 3:
+            dirty.add(record[3:])
+    return dirty
 
 def file_has_changes(filepath, cwd):
-    proc = run_command_no_raise(['git', 'diff', '--quiet', '--', filepath], cwd=cwd)
-    if proc.returncode != 0:
-        return True
-    proc2 = run_command_no_raise(['git', 'diff', '--cached', '--quiet', '--', filepath], cwd=cwd)
-    return proc2.returncode != 0
+    repo = _pygit2_repo(cwd)
+    if repo is not None:
+        try:
+            return repo.status_file(filepath.replace(os.sep, '/')) != pygit2.GIT_STATUS_CURRENT
+        except Exception:
+            pass
+    dirty_worktree, dirty_index = workspace_state(filepath, cwd)
+    return dirty_worktree or dirty_index
+
+# Commit message differs per file only in the filename; build the template
+# (and resolve config.BUG_ID) once at import.
+_COMMIT_MSG_TEMPLATE = (
+    "[webaudio-testharness] Migrate {name}\n\n"
+    "Convert {name} from the legacy audit.js runner to pure testharness.js\n\n"
+    "Bug: " + _BUG_ID
+)
 
 def commit_and_upload(filepath, cwd):
-    run_command(['git', 'add', filepath], cwd=cwd)
-    filename = os.path.basename(filepath)
-    title = f"[webaudio-testharness] Migrate {filename}"
-    body = f"Convert {filename} from the legacy audit.js runner to pure testharness.js\n\nBug: {config.BUG_ID}"
-    msg = f"{title}\n\n{body}"
-    run_command(['git', 'commit', '-m', msg], cwd=cwd)
-
-    cmd = list(GIT_CL_UPLOAD_BASE_CMD)
-    if getattr(config, 'GERRIT_REVIEWERS', None):
-        cmd.extend(['-r', ','.join(config.GERRIT_REVIEWERS)])
-    run_command(cmd, cwd=cwd)
+    msg = _COMMIT_MSG_TEMPLATE.format(name=os.path.basename(filepath))
+    # pathspec-limited commit: one git process stages and commits the file
+    # (the converted file is always already tracked)
+    run_command(['git', 'commit', '-o', filepath, '-m', msg], cwd=cwd, capture_output='error-only')
+    _upload_cl(cwd)
+
+def _upload_cl(cwd):
+    run_command(list(_UPLOAD_CMD), cwd=cwd, capture_output='error-only')
+
+def stage_file(filepath, cwd):
+    run_command(['git', 'add', filepath], cwd=cwd, capture_output='error-only')
+
+class GitDaemon:
+    """
+    Batched staging: stage() only queues paths in memory, and flush_staging()
+    feeds them all to a single `git update-index --add --stdin` run. One git
+    startup (config parse, refs scan, index load — dozens of ms each on
+    chromium/src) per upload batch instead of one per file, and crucially no
+    process holding .git/index.lock between flushes — `git checkout -- <file>`
+    after a failed web test would die on that lock otherwise.
+
+    Callers must flush_staging() before running `git commit`; staging errors
+    surface there, via update-index's exit status, and fall back to one-shot
+    `git add` per path so a single bad path cannot drop its batch-mates.
+    """
+
+    def __init__(self, cwd):
+        self.cwd = cwd
+        self._staged_pending = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def stage(self, filepath):
+        """Queue filepath for staging at the next flush_staging()."""
+        self._staged_pending.append(filepath)
+
+    def discard_staging(self):
+        """Drop queued paths without staging them (rollback path)."""
+        self._staged_pending = []
+
+    def flush_staging(self):
+        """Stage every queued path with one update-index run. Returns the
+        paths that could not be staged (normally empty); callers must not
+        treat those as uploaded."""
+        pending, self._staged_pending = self._staged_pending, []
+        if not pending:
+            return []
+        try:
+            proc = subprocess.run(
+                ['git', 'update-index', '--add', '--stdin'],
+                input=''.join(p + '\n' for p in pending), text=True,
+                cwd=self.cwd, stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE, timeout=60, **_SPAWN_KWARGS)
+            rc = proc.returncode
+        except (OSError, subprocess.TimeoutExpired) as e:
+            logging.warning("update-index failed to run: %s", e)
+            rc = -1
+        if rc == 0:
+            return []
+        logging.warning("update-index exited %s; restaging %d path(s) via git add", rc, len(pending))
+        failed = []
+        for filepath in pending:
+            try:
+                stage_file(filepath, cwd=self.cwd)
+            except Exception as e:
+                logging.error("Fallback staging failed for %s: %s", filepath, e)
+                failed.append(filepath)
+        return failed
+
+    def close(self):
+        # deliberately discards queued-but-unflushed paths: mutating the index
+        # behind the caller's back at interpreter exit is worse than dropping
+        # a stage that was never committed anyway
+        self.discard_staging()
+
+def restore_file(filepath, cwd):
+    """Throw away worktree changes to a single file (e.g. after a failed test)."""
+    run_command(['git', 'checkout', '--', filepath], cwd=cwd, capture_output='error-only')
+
+def flush_batch(cwd, files):
+    """
+    Commit all staged files as a single CL and run git cl upload once.
+    The Gerrit round-trip dominates upload cost, so batching N files into one
+    CL cuts it by N compared to one upload per file.
+    """
+    if not files:
+        return
+    names = [os.path.basename(f) for f in files]
+    if len(names) == 1:
+        msg = _COMMIT_MSG_TEMPLATE.format(name=names[0])
+    else:
+        msg = (
+            f"[webaudio-testharness] Migrate {len(names)} webaudio tests\n\n"
+            "Convert the following tests from the legacy audit.js runner to pure testharness.js:\n\n"
+            + "\n".join(f"- {n}" for n in names)
+            + f"\n\nBug: {_BUG_ID}"
+        )
+    run_command(['git', 'commit', '-m', msg], cwd=cwd, capture_output='error-only')
+    _upload_cl(cwd)
 
 # --- Run single web-test and capture logs ---
 def run_single_web_test(chromium_src, rel_test_path):
@@ -170,14 +543,11 @@ def run_single_web_test(chromium_src, rel_test_path):
         rel_test_path
     ]
     logging.info("Running web-test: %s", " ".join(cmd))
-    proc = run_command_no_raise(cmd, cwd=chromium_src)
-
-    with open(log_path, 'wb') as fh:
-        if proc.stdout:
-            fh.write(proc.stdout.encode('utf-8', errors='replace'))
-        if proc.stderr:
-            fh.write(b"\n=== STDERR ===\n")
-            fh.write(proc.stderr.encode('utf-8', errors='replace'))
+    # Stream child output straight to the log file descriptor; the output can
+    # be tens of MB and buffering it through Python strings doubles the cost.
+    with open(log_path, 'wb', buffering=0) as fh:
+        proc = subprocess.run(cmd, stdout=fh, stderr=subprocess.STDOUT,
+                              cwd=chromium_src, check=False, **_SPAWN_KWARGS)
 
     if proc.returncode == 0:
         logging.info("Web test PASSED for %s (log: %s).", rel_test_path, log_path)
@@ -1,6 +1,12 @@
 #!/usr/bin/env python3
+import asyncio
+import functools
+import hashlib
+import json
 import os
 import logging
+import random
+import re
 import time
 from pathlib import Path
 import google.generativeai as genai
@@ -8,7 +14,27 @@ import config
 
 # Constants (relevant for Gemini retries)
 MAX_API_RETRIES = 4
+MAX_RATE_LIMIT_RETRIES = 8
+MAX_TRANSIENT_RETRIES = 2
 API_BACKOFF_BASE = 1.5
+MAX_BACKOFF_SECONDS = 60.0
+BATCH_SIZE = 8
+
+# Exception classes raised by the server, split by retry policy:
+# rate-limit/5xx get exponential backoff with jitter, transient parse/validation
+# errors get an immediate retry, permanent errors abort without retrying.
+_RATE_LIMIT_ERRORS = ('ResourceExhausted', 'TooManyRequests', 'InternalServerError',
+                      'ServiceUnavailable', 'DeadlineExceeded', 'GatewayTimeout')
+_PERMANENT_ERRORS = ('InvalidArgument', 'PermissionDenied', 'Unauthenticated',
+                     'NotFound', 'FailedPrecondition', 'BlockedPromptException')
+
+def _classify_error(e):
+    name = type(e).__name__
+    if name in _RATE_LIMIT_ERRORS or getattr(e, 'code', None) == 429:
+        return 'rate-limit'
+    if name in _PERMANENT_ERRORS:
+        return 'permanent'
+    return 'transient'
 
 # Conversion prompt (strict mechanical conversion)
 CONVERSION_INSTRUCTIONS = """
@@ -79,69 +105,517 @@ Now: convert the file content (which follows) into the new file content and retu
 the converted file (no explanation, no metadata, no leading/trailing whitespace).
 """
 
+# Server-side cache of the static instruction prefix (set at init time)
+INSTRUCTION_CACHE_TTL = "3600s"
+_instruction_cache = None
+_instructions_cached = False
+
+@functools.lru_cache(maxsize=1)
 def initialize_gemini_client():
+    # memoized: repeat callers share one client so the underlying transport's
+    # connection pool stays warm across files
+    global _instruction_cache, _instructions_cached
     api_key = os.getenv('GEMINI_API_KEY')
     if not api_key:
         raise RuntimeError("GEMINI_API_KEY not found in environment (.env missing or key absent).")
     genai.configure(api_key=api_key)
+    # Cache CONVERSION_INSTRUCTIONS server-side so every request only uploads
+    # the per-file payload; cached prefix tokens are billed at a steep discount.
+    try:
+        _instruction_cache = genai.caching.CachedContent.create(
+            model=config.GEMINI_MODEL_NAME,
+            system_instruction=CONVERSION_INSTRUCTIONS,
+            ttl=INSTRUCTION_CACHE_TTL,
+        )
+        _instructions_cached = True
+        logging.info("Created instruction cache: %s", _instruction_cache.name)
+        return genai.GenerativeModel.from_cached_content(_instruction_cache)
+    except Exception as e:
+        logging.warning("Context caching unavailable (%s); sending instructions inline.", e)
+        _instruction_cache = None
+        _instructions_cached = False
     try:
         return genai.GenerativeModel(config.GEMINI_MODEL_NAME)
     except Exception:
         return genai
 
+def refresh_instruction_cache():
+    """Extend the instruction cache TTL; call periodically on long queues."""
+    if _instruction_cache is not None:
+        try:
+            _instruction_cache.update(ttl=INSTRUCTION_CACHE_TTL)
+        except Exception as e:
+            logging.warning("Failed to refresh instruction cache TTL: %s", e)
+
+def _resolve_generate(model):
+    """Pick the client's generate entry point once so callers don't re-probe
+    attribute availability on every attempt."""
+    if hasattr(model, 'generate_content'):
+        return model.generate_content
+    if hasattr(model, 'generate'):
+        return model.generate
+    if hasattr(genai, 'generate'):
+        return lambda prompt: genai.generate(model=config.GEMINI_MODEL_NAME, prompt=prompt)
+    if callable(model):
+        return model
+    raise RuntimeError("No known generate method available on Gemini client.")
+
+def _extract_text(resp):
+    if isinstance(resp, dict):
+        new_text = resp.get('output', resp.get('text', None)) or str(resp)
+    else:
+        new_text = getattr(resp, 'text', None) or getattr(resp, 'content', None) or str(resp)
+    if not new_text or not str(new_text).strip():
+        raise RuntimeError("Gemini returned empty response.")
+    return str(new_text)
+
+def _generate_once(model, prompt):
+    return _extract_text(_resolve_generate(model)(prompt))
+
+def _backoff_seconds(e, attempt):
+    # honor the server's Retry-After hint when present, else jittered exponential
+    retry_delay = getattr(e, 'retry_delay', None)
+    if retry_delay is not None:
+        try:
+            return min(MAX_BACKOFF_SECONDS, float(getattr(retry_delay, 'seconds', retry_delay)))
+        except (TypeError, ValueError):
+            pass
+    return random.uniform(0, min(MAX_BACKOFF_SECONDS, 2.0 ** attempt))
+
+def _next_retry_wait(e, counters):
+    """
+    Classify e, bump the matching counter in counters ({'rate-limit': n,
+    'transient': n}) and return seconds to sleep before retrying, or None when
+    retries are exhausted. Raises immediately for permanent errors.
+    """
+    kind = _classify_error(e)
+    if kind == 'permanent':
+        raise RuntimeError(f"Gemini call failed permanently: {e}") from e
+    if kind == 'rate-limit':
+        counters['rate-limit'] += 1
+        if counters['rate-limit'] > MAX_RATE_LIMIT_RETRIES:
+            return None
+        wait = _backoff_seconds(e, counters['rate-limit'])
+        logging.warning("Gemini rate-limited/5xx (attempt %d/%d): %s. Backing off %.1fs",
+                        counters['rate-limit'], MAX_RATE_LIMIT_RETRIES, e, wait)
+        return wait
+    counters['transient'] += 1
+    if counters['transient'] > MAX_TRANSIENT_RETRIES:
+        return None
+    logging.warning("Gemini transient failure (attempt %d/%d): %s. Retrying immediately.",
+                    counters['transient'], MAX_TRANSIENT_RETRIES, e)
+    return 0.0
+
 def call_gemini_with_retries(model, prompt):
     last_exc = None
-    for attempt in range(1, MAX_API_RETRIES + 1):
+    counters = {'rate-limit': 0, 'transient': 0}
+    generate = _resolve_generate(model)
+    while True:
+        try:
+            logging.info("Calling Gemini...")
+            return _extract_text(generate(prompt))
+        except Exception as e:
+            last_exc = e
+            wait = _next_retry_wait(e, counters)
+            if wait is None:
+                break
+            if wait:
+                time.sleep(wait)
+    raise RuntimeError("All Gemini attempts failed.") from last_exc
+
+def call_gemini_streaming_to_file(model, prompt, tmp_path):
+    """
+    Generate with stream=True, writing chunks to tmp_path as they arrive so
+    network RX overlaps disk write and the response is never buffered whole.
+    Returns the full text; the retry envelope truncates tmp_path per attempt.
+    Falls back to the buffered call for clients without streaming support.
+    """
+    last_exc = None
+    counters = {'rate-limit': 0, 'transient': 0}
+    while True:
         try:
-            logging.info("Calling Gemini (attempt %d/%d)...", attempt, MAX_API_RETRIES)
-            if hasattr(model, 'generate_content'):
-                resp = model.generate_content(prompt)
-                new_text = getattr(resp, 'text', None) or getattr(resp, 'content', None) or str(resp)
-            elif hasattr(model, 'generate'):
-                resp = model.generate(prompt)
-                new_text = getattr(resp, 'text', None) or getattr(resp, 'content', None) or str(resp)
-            elif hasattr(genai, 'generate'):
-                resp = genai.generate(model=config.GEMINI_MODEL_NAME, prompt=prompt)
-                new_text = resp.get('output', resp.get('text', None)) or str(resp)
-            elif callable(model):
-                resp = model(prompt)
-                new_text = getattr(resp, 'text', None) or getattr(resp, 'content', None) or str(resp)
-            else:
-                raise RuntimeError("No known generate method available on Gemini client.")
-            if not new_text or not str(new_text).strip():
+            pieces = []
+            with open(tmp_path, 'w', encoding='utf-8') as fh:
+                if hasattr(model, 'generate_content'):
+                    logging.info("Calling Gemini (streaming)...")
+                    for chunk in model.generate_content(prompt, stream=True):
+                        text = getattr(chunk, 'text', '') or ''
+                        fh.write(text)
+                        pieces.append(text)
+                else:
+                    logging.info("Calling Gemini...")
+                    pieces.append(_generate_once(model, prompt))
+                    fh.write(pieces[0])
+            full = ''.join(pieces)
+            if not full.strip():
                 raise RuntimeError("Gemini returned empty response.")
-            return str(new_text)
+            return full
         except Exception as e:
             last_exc = e
-            wait = (API_BACKOFF_BASE ** (attempt - 1)) + (attempt * 0.1)
-            logging.warning("Gemini attempt %d failed: %s. Backing off %.1fs", attempt, e, wait)
-            time.sleep(wait)
+            wait = _next_retry_wait(e, counters)
+            if wait is None:
+                break
+            if wait:
+                time.sleep(wait)
     raise RuntimeError("All Gemini attempts failed.") from last_exc
 
+async def _generate_once_async(model, prompt):
+    if hasattr(model, 'generate_content_async'):
+        resp = await model.generate_content_async(prompt)
+        new_text = getattr(resp, 'text', None) or getattr(resp, 'content', None) or str(resp)
+        if not new_text or not str(new_text).strip():
+            raise RuntimeError("Gemini returned empty response.")
+        return str(new_text)
+    # SDK without async support: run the blocking path off the event loop
+    return await asyncio.to_thread(_generate_once, model, prompt)
+
+async def call_gemini_with_retries_async(model, prompt):
+    """Async twin of call_gemini_with_retries: same retry policy, non-blocking sleeps."""
+    last_exc = None
+    counters = {'rate-limit': 0, 'transient': 0}
+    while True:
+        try:
+            logging.info("Calling Gemini...")
+            return await _generate_once_async(model, prompt)
+        except Exception as e:
+            last_exc = e
+            wait = _next_retry_wait(e, counters)
+            if wait is None:
+                break
+            if wait:
+                await asyncio.sleep(wait)
+    raise RuntimeError("All Gemini attempts failed.") from last_exc
+
+# Client-side pre-transforms for the purely mechanical conversion rules.
+# Sub-millisecond regex work here shrinks every prompt, and files that come
+# out free of audit.js references skip the API round-trip entirely.
+# Rule 7: should(actual, desc).beConstantValueOf(x)
+#           -> assert_array_equals(actual, ...fill(x), desc)
+# Only fires on the full expression with a simple actual (no nested
+# commas/parens) and a string-literal description, so the real arguments are
+# substituted; anything fancier is left to the model.
+_BE_CONSTANT_RE = re.compile(
+    r'should\(\s*([^,()]+?)\s*,\s*(\'[^\']*\'|"[^"]*")\s*\)'
+    r'\s*\.beConstantValueOf\(\s*([^()]+?)\s*\)')
+# Rule 10: single-argument anonymous callbacks -> arrow functions. Only in
+# callback position (right after an open paren), and only when the body uses
+# neither `this` nor `arguments` — an arrow would rebind both.
+_CALLBACK_FN_RE = re.compile(r'\(\s*function\s*\(\s*([A-Za-z_$][\w$]*)\s*\)\s*\{')
+_THIS_OR_ARGS_RE = re.compile(r'\b(?:this|arguments)\b')
+
+def _arrow_repl(m):
+    # brace-count from the opening '{' to find the body, then leave
+    # `this`/`arguments`-sensitive callbacks alone (a hit inside a string or
+    # comment just skips the rewrite, which is always safe)
+    s = m.string
+    depth, i = 1, m.end()
+    while i < len(s) and depth:
+        if s[i] == '{':
+            depth += 1
+        elif s[i] == '}':
+            depth -= 1
+        i += 1
+    if _THIS_OR_ARGS_RE.search(s, m.end(), i):
+        return m.group(0)
+    return f'({m.group(1)} => {{'
+
+# Markers that mean the file still depends on the audit.js runner
+_AUDIT_MARKERS = ('audit.js', 'audit.define', 'audit.run', 'Audit.createTaskRunner')
+
+def pre_transform(text):
+    """Apply the mechanical conversion rules locally; returns (text, applied)."""
+    new_text, n_const = _BE_CONSTANT_RE.subn(
+        r'assert_array_equals(\1, new Float32Array(\1.length).fill(\3), \2)', text)
+    new_text, n_arrow = _CALLBACK_FN_RE.subn(_arrow_repl, new_text)
+    # rule 11 (string concat -> template literals) is deliberately left to the
+    # model: it is not safely expressible as a regex substitution
+    return new_text, (n_const + n_arrow) > 0
+
+def needs_gemini(text):
+    """True when the file still references the audit.js runner."""
+    return any(marker in text for marker in _AUDIT_MARKERS)
+
+# Batch framing (several files per request; response is one JSON object)
+BATCH_RESPONSE_INSTRUCTIONS = """
+You will receive SEVERAL files in one request, each delimited as:
+<<FILE i path=...>>
+<content>
+<<END i>>
+
+Apply the conversion rules above to EVERY file independently. Respond with a single
+JSON object mapping each file's index (as a string) to its full converted content,
+e.g. {"0": "<converted file 0>", "1": "<converted file 1>"}. Output ONLY the JSON
+object — no commentary, no markdown fences.
+"""
+
 def build_prompt(file_path, original_content):
+    prefix = "" if _instructions_cached else f"{CONVERSION_INSTRUCTIONS}\n\n"
     return (
-        f"{CONVERSION_INSTRUCTIONS}\n\n"
+        f"{prefix}"
         f"File path: {file_path}\n"
         f"Original file content below (begin):\n---\n{original_content}\n---\n"
         "Provide the full converted file content now. ONLY the file content — no commentary.\n"
     )
 
+def write_converted(file_path, new_content, original=None, streamed_tmp=None):
+    """
+    Atomically write converted content; returns 'modified' or 'no-change'.
+    streamed_tmp names a tmp file that already holds new_content (from the
+    streaming path), saving the extra write here.
+    """
+    p = Path(file_path)
+    if original is None:
+        original = p.read_text(encoding='utf-8')
+    no_change = new_content == original  # byte-equal: no stripped copies needed
+    if not no_change:
+        # leading/trailing whitespace-only diffs are not worth a write, rename
+        # and the downstream git diff churn
+        no_change = new_content.strip() == original.strip()
+    if no_change:
+        logging.info("Gemini returned no changes for %s", file_path)
+        if streamed_tmp is not None:
+            try:
+                os.unlink(streamed_tmp)
+            except OSError:
+                pass
+        return "no-change"
+
+    if streamed_tmp is not None:
+        tmp = Path(streamed_tmp)
+    else:
+        tmp = p.with_suffix(p.suffix + '.converted.tmp')
+        tmp.write_text(new_content, encoding='utf-8')
+    os.replace(str(tmp), str(p))
+    logging.info("Wrote converted content to %s", file_path)
+    return "modified"
+
 def convert_file_with_gemini(model, file_path):
     logging.info("Processing file on disk: %s", file_path)
     p = Path(file_path)
     if not p.exists():
         raise FileNotFoundError(f"{file_path} does not exist")
 
-    original = p.read_text(encoding='utf-8')
-    prompt = build_prompt(str(file_path), original)
-    new_content = call_gemini_with_retries(model, prompt)
-
-    if new_content.strip() == original.strip():
-        logging.info("Gemini returned no changes for %s", file_path)
+    # read bytes once: the cache key is hashed from them directly, and the
+    # single decoded copy below is the only file-sized str we keep around
+    orig_bytes = p.read_bytes()
+    original = orig_bytes.decode('utf-8')
+    new_content = conv_cache_lookup(orig_bytes)
+    if new_content is CACHE_NO_CHANGE:
+        logging.info("Known no-op conversion for %s; skipping API and write.", file_path)
         return "no-change"
+    if new_content is not None:
+        logging.info("Conversion cache hit for %s", file_path)
+    else:
+        transformed, _ = pre_transform(original)
+        if not needs_gemini(transformed):
+            logging.info("Fully mechanical conversion for %s; skipping Gemini.", file_path)
+            new_content = transformed
+        else:
+            # stream the response straight into the tmp file that write_converted
+            # will rename into place
+            prompt = build_prompt(str(file_path), transformed)
+            tmp = p.with_suffix(p.suffix + '.converted.tmp')
+            new_content = call_gemini_streaming_to_file(model, prompt, tmp)
+            conv_cache_store(orig_bytes, new_content)
+            result = write_converted(file_path, new_content, original=original,
+                                     streamed_tmp=tmp)
+            if result == "no-change":
+                conv_cache_store_no_change(orig_bytes)
+            return result
+        conv_cache_store(orig_bytes, new_content)
+    result = write_converted(file_path, new_content, original=original)
+    if result == "no-change":
+        conv_cache_store_no_change(orig_bytes)
+    return result
 
-    tmp = p.with_suffix(p.suffix + '.converted.tmp')
-    tmp.write_text(new_content, encoding='utf-8')
-    os.replace(str(tmp), str(p))
-    logging.info("Wrote converted content to %s", file_path)
-    return "modified"
+# On-disk conversion cache keyed by sha256(instructions + original content),
+# so re-runs and retries skip the API entirely for already-seen inputs.
+# Inputs that previously converted to themselves get a tiny .nochange marker
+# instead of a full duplicate of the file content.
+CONV_CACHE_DIR = Path(__file__).resolve().parent / '.conv_cache'
+CONV_CACHE_MAX_ENTRIES = 512
+
+# sentinel returned by conv_cache_lookup for known-no-op inputs; distinct
+# from any real converted text
+CACHE_NO_CHANGE = object()
+
+def _conv_cache_key(original):
+    # accepts bytes so callers that already hold the raw file bytes do not
+    # pay a full re-encode just to hash them
+    if isinstance(original, str):
+        original = original.encode('utf-8')
+    return hashlib.sha256(
+        CONVERSION_INSTRUCTIONS.encode('utf-8') + b'\0' + original
+    ).hexdigest()
+
+def conv_cache_lookup(original):
+    """Return the cached converted text for this original, CACHE_NO_CHANGE
+    for inputs known to convert to themselves, or None."""
+    entry = CONV_CACHE_DIR / _conv_cache_key(original)
+    if entry.with_suffix('.nochange').exists():
+        return CACHE_NO_CHANGE
+    try:
+        return entry.read_text(encoding='utf-8')
+    except (FileNotFoundError, OSError):
+        return None
+
+def conv_cache_store(original, converted):
+    try:
+        CONV_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        entry = CONV_CACHE_DIR / _conv_cache_key(original)
+        tmp = entry.with_suffix('.tmp')
+        tmp.write_text(converted, encoding='utf-8')
+        os.replace(str(tmp), str(entry))
+        _conv_cache_prune()
+    except OSError as e:
+        logging.warning("Failed to write conversion cache entry: %s", e)
+
+def conv_cache_invalidate(original):
+    """Drop the cached conversion for this original, e.g. after its output
+    failed the web test — otherwise every retry replays the same bad result
+    instead of re-querying Gemini."""
+    entry = CONV_CACHE_DIR / _conv_cache_key(original)
+    for stale in (entry, entry.with_suffix('.nochange')):
+        try:
+            stale.unlink()
+        except OSError:
+            pass
+
+def conv_cache_store_no_change(original):
+    """Record that this original converts to itself; later runs then skip the
+    API call, the write and the content comparison outright."""
+    try:
+        CONV_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        marker = (CONV_CACHE_DIR / _conv_cache_key(original)).with_suffix('.nochange')
+        marker.touch()
+    except OSError as e:
+        logging.warning("Failed to write conversion cache marker: %s", e)
+
+def _conv_cache_prune():
+    entries = [p for p in CONV_CACHE_DIR.iterdir() if p.suffix != '.tmp']
+    if len(entries) <= CONV_CACHE_MAX_ENTRIES:
+        return
+    # evict least-recently-read entries first
+    entries.sort(key=lambda p: os.path.getatime(p))
+    for stale in entries[:len(entries) - CONV_CACHE_MAX_ENTRIES]:
+        try:
+            stale.unlink()
+        except OSError:
+            pass
+
+def build_batch_prompt(entries):
+    sections = []
+    for i, (file_path, content) in enumerate(entries):
+        sections.append(f"<<FILE {i} path={file_path}>>\n{content}\n<<END {i}>>")
+    prefix = "" if _instructions_cached else f"{CONVERSION_INSTRUCTIONS}\n"
+    return (
+        f"{prefix}{BATCH_RESPONSE_INSTRUCTIONS}\n"
+        + "\n".join(sections)
+        + "\nProvide the JSON object now.\n"
+    )
+
+def _parse_batch_response(raw, expected_count):
+    """Parse the JSON batch response; returns list of converted texts or None on failure."""
+    text = raw.strip()
+    # tolerate markdown fences despite the instructions
+    if text.startswith('```'):
+        text = text.strip('`')
+        if text.startswith('json'):
+            text = text[len('json'):]
+    try:
+        obj = json.loads(text)
+    except ValueError as e:
+        logging.warning("Batch response is not valid JSON: %s", e)
+        return None
+    results = []
+    for i in range(expected_count):
+        converted = obj.get(str(i))
+        if not converted or not str(converted).strip():
+            logging.warning("Batch response missing or empty entry for index %d", i)
+            return None
+        results.append(str(converted))
+    return results
+
+def convert_files_batch(model, abs_paths, batch_size=BATCH_SIZE):
+    """
+    Convert several files per Gemini request to amortize API round-trips.
+    Returns {abs_path: converted_text}; paths whose conversion failed are absent
+    (callers should leave them in the queue). Falls back to per-file requests
+    when a batch response cannot be parsed.
+    """
+    entries = []
+    for abs_path in abs_paths:
+        p = Path(abs_path)
+        if not p.exists():
+            logging.error("File does not exist, skipping: %s", abs_path)
+            continue
+        try:
+            entries.append((str(abs_path), p.read_text(encoding='utf-8')))
+        except (OSError, UnicodeDecodeError) as e:
+            # skip just this file; it stays in the queue without a result
+            logging.error("Cannot read %s, skipping: %s", abs_path, e)
+
+    batches = [entries[i:i + batch_size] for i in range(0, len(entries), batch_size)]
+    # All batches share one event loop: in-flight requests are plain awaits
+    # instead of threads, bounded by a semaphore sized to Gemini's rate limit.
+    return asyncio.run(_convert_batches_async(model, batches))
+
+async def _convert_batches_async(model, batches):
+    semaphore = asyncio.Semaphore(getattr(config, 'GEMINI_CONCURRENCY', 4))
+    results = {}
+    for batch_results in await asyncio.gather(
+            *(_convert_batch_async(model, batch, semaphore) for batch in batches)):
+        results.update(batch_results)
+    return results
+
+async def _convert_batch_async(model, batch, semaphore):
+    """Convert one batch of (path, content) pairs; returns {path: converted_text}."""
+    results = {}
+    pending = []
+    for file_path, content in batch:
+        cached = conv_cache_lookup(content)
+        if cached is CACHE_NO_CHANGE:
+            # hand the original back: write_converted downstream sees equal
+            # content and reports no-change without an API call
+            logging.info("Known no-op conversion for %s; skipping API.", file_path)
+            results[file_path] = content
+            continue
+        if cached is not None:
+            logging.info("Conversion cache hit for %s", file_path)
+            results[file_path] = cached
+            continue
+        transformed, _ = pre_transform(content)
+        if not needs_gemini(transformed):
+            logging.info("Fully mechanical conversion for %s; skipping Gemini.", file_path)
+            results[file_path] = transformed
+            conv_cache_store(content, transformed)
+        else:
+            # keep the untouched original around: it is the cache key
+            pending.append((file_path, transformed, content))
+    if not pending:
+        return results
+
+    converted = None
+    try:
+        async with semaphore:
+            raw = await call_gemini_with_retries_async(
+                model, build_batch_prompt([(fp, tr) for fp, tr, _ in pending]))
+        converted = _parse_batch_response(raw, len(pending))
+    except Exception as e:
+        logging.warning("Batch conversion failed: %s", e)
+    if converted is not None:
+        for (file_path, _, content), new_content in zip(pending, converted):
+            results[file_path] = new_content
+            conv_cache_store(content, new_content)
+        return results
+    # partial/parse failure: fall back to one request per file
+    logging.info("Falling back to per-file conversion for %d file(s).", len(pending))
+    for file_path, transformed, content in pending:
+        try:
+            async with semaphore:
+                new_content = await call_gemini_with_retries_async(model, build_prompt(file_path, transformed))
+            results[file_path] = new_content
+            conv_cache_store(content, new_content)
+        except Exception as e:
+            logging.error("Per-file conversion failed for %s: %s", file_path, e)
+    return results